@@ -1,23 +1,30 @@
 #!/usr/bin/env python3
 
-import argparse
+from __future__ import annotations
+
+import atexit
+import functools
+import mmap
 import sys
 import os
-import re
-import subprocess
-import fileinput
-import yaml
-import curses
-import getch
-import uuid
-
-from blessed import Terminal
-from terminaltables import AsciiTable, SingleTable
-from todotxt import TodoFile, TodoEntry
-from typing import List
+import unicodedata
+
+from typing import List, TYPE_CHECKING
 from datetime import datetime, timedelta
 
+# Terminal UI, todo.txt, YAML, argparse, subprocess and uuid modules are imported
+# by the functions using them, so that other actions do not pay for their import
+if TYPE_CHECKING:
+    from todotxt import TodoEntry, TodoFile
+
 CONFIG_FOLDER="~/.config/dreammate"
+CONFIG_FOLDER_PATH = os.path.expanduser(CONFIG_FOLDER)
+LEDGER_FILE_PATH = "{}/time.ledger".format(CONFIG_FOLDER_PATH)
+
+# Date part of a ledger entry, after the "i "/"o " prefix
+LEDGER_DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+# Date accepted by dm restart -d
+RESTART_DATE_FORMAT = "%Y/%m/%d %H:%M"
 
 usage_string = '''
 
@@ -46,21 +53,370 @@ Available actions:
 
 '''
 
-def get_scm_commit_commands(scm, commit_message):
+# Up and down arrows, in normal (CSI) and application (SS3) cursor mode
+ARROW_UP_KEYS = (b'\x1b[A', b'\x1bOA')
+ARROW_DOWN_KEYS = (b'\x1b[B', b'\x1bOB')
+
+# Usage and description of the actions taking only positional arguments
+actions_usage = {
+    "start": (
+        "dm start <project>",
+        "Start tracking time for a given project"
+    ),
+    "commit": (
+        "dm commit",
+        "Ends current activity on current project by choosing a task to set done"
+    ),
+    "log": (
+        "dm log <project> [--legacy]",
+        "Get every time entry for a given project, --legacy to get the report from ledger"
+    ),
+}
+
+def parse_action(cli_args, usage):
+    """
+    Return the action verb in cli_args, print usage and exit
+    if it is missing or help is requested
+    """
+    if len(cli_args) == 0:
+        print('ERROR: No action provided')
+        print(usage)
+        exit(1)
+
+    if cli_args[0] in ("-h", "--help"):
+        print(usage)
+        exit(0)
+
+    return cli_args[0]
+
+def parse_positional_args(action, cli_args):
+    """
+    Return cli_args after checking that they match the
+    positional arguments in the usage of action, print its help on -h
+    """
+    usage, description = actions_usage[action]
+    # Placeholders of the positional arguments, e.g. <project>,
+    # options in square brackets are handled by the action itself
+    expected_args = [arg for arg in usage.split()[2:] if not arg.startswith("[")]
+
+    if "-h" in cli_args or "--help" in cli_args:
+        print("usage: {}\n\n{}".format(usage, description))
+        exit(0)
+
+    if len(cli_args) != len(expected_args):
+        print("usage: {}".format(usage))
+        print("ERROR: Expected arguments: {}, got: {}".format(
+            " ".join(expected_args) or "none",
+            " ".join(cli_args) or "none"
+        ))
+        exit(1)
+
+    return cli_args
+
+@functools.lru_cache(maxsize=None)
+def get_tasks_add_parser():
+    """
+    Argument parser of dm tasks add, built once
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Add different tasks to a project (default to active_project)",
+        usage="dm tasks add [-h] [-p <project_name>] [-c <context>] [-r <priority>] [<task>]"
+    )
+
+    parser.add_argument(
+        "-p",
+        "--project",
+        help="Project to add tasks to"
+    )
+
+    parser.add_argument(
+        "-c",
+        "--context",
+        help="Context to add to the task (as defined in the project file configuration)"
+    )
+
+    parser.add_argument(
+        "-r",
+        "--priority",
+        choices=["A", "B", "C", "D", "E", "F", "G"],
+        help="Priority of the task to create"
+    )
+
+    parser.add_argument(
+        'task',
+        nargs='?',
+        default=None
+    )
+
+    return parser
+
+@functools.lru_cache(maxsize=None)
+def get_tasks_list_parser():
+    """
+    Argument parser of dm tasks list, built once
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Get all task for a given project (defaults to active project)",
+        usage="dm tasks list [-h] [-p <project_name>] [-n <number>]"
+    )
+
+    parser.add_argument(
+        "-p",
+        "--project",
+        help="Project to show all tasks of"
+    )
+
+    parser.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        help="Show all tasks (completed and to be done)"
+    )
+
+    parser.add_argument(
+        "-n",
+        "--number",
+        type=int,
+        help="Number of tasks to print to output"
+    )
+
+    return parser
+
+@functools.lru_cache(maxsize=None)
+def get_tasks_delete_parser():
+    """
+    Argument parser of dm tasks delete, built once
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Delete a task from a project (defaults to active project)",
+        usage="dm tasks delete [-h] [-p <project_name>]"
+    )
+
+    parser.add_argument(
+        "-p",
+        "--project",
+        help="Project to show all tasks of"
+    )
+
+    return parser
+
+@functools.lru_cache(maxsize=None)
+def get_restart_parser():
+    """
+    Argument parser of dm restart, built once
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Restart the current project so that changes can be committed. A custom datetime can be set as restart time",
+        usage="dm restart -d <datetime> -p <project>"
+    )
+
+    parser.add_argument(
+        '-d',
+        '--datetime',
+        help="Datetime in Y/m/d H:M to use as a restart date"
+    )
+    parser.add_argument(
+        '-p',
+        '--project',
+        help="Project to restart if current project is not paused but already committed"
+    )
+
+    return parser
+
+def get_scm_commit_command(scm, commit_message):
     if scm == 'git':
+        # Single process for both steps, the message is passed
+        # as a positional argument so it is never parsed by the shell
         return [
-            ["git", "add", "."],
-            ["git", "commit", "-m", commit_message]
+            "sh",
+            "-c",
+            'git add . && git commit -m "$1"',
+            "sh",
+            commit_message
         ]
     else:
-        return []
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_todo_file_path(project_name):
+    return "{}/{}_TODO.txt".format(CONFIG_FOLDER_PATH, project_name)
+
+# Parsed YAML files by path, along with the (mtime_ns, size) they had
+yaml_cache = {}
+
+def load_yaml_file(file_path):
+    """
+    Parse a YAML file, the result is kept in yaml_cache
+    and reused until the file modification time or size change
+    """
+    file_stat = os.stat(file_path)
+    file_version = (file_stat.st_mtime_ns, file_stat.st_size)
+
+    cached_entry = yaml_cache.get(file_path)
+
+    if cached_entry != None and cached_entry[0] == file_version:
+        return cached_entry[1]
+
+    # yaml is only needed by a few actions, do not pay its import on every run
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import SafeLoader as YamlLoader
+
+    # Bytes are handed to the parser as they are, it detects the encoding
+    with open(file_path, 'rb') as file_content:
+        content = yaml.load(file_content, Loader=YamlLoader)
+
+    yaml_cache[file_path] = (file_version, content)
+
+    return content
+
+def format_created_date(created_date: str) -> str:
+    """
+    Convert a YYYY-MM-DD task creation date to DD/MM/YY
+    """
+    year, month, day = created_date[:10].split("-")
+
+    return "{}/{}/{}".format(day, month, year[2:])
+
+def parse_date(date_string, date_format):
+    """
+    Parse a date in LEDGER_DATE_FORMAT or RESTART_DATE_FORMAT by slicing
+    its fixed width fields, strptime is only used when the layout differs
+    """
+    has_seconds = date_format == LEDGER_DATE_FORMAT
+
+    if len(date_string) == (19 if has_seconds else 16):
+        fields = [
+            date_string[0:4],
+            date_string[5:7],
+            date_string[8:10],
+            date_string[11:13],
+            date_string[14:16],
+        ]
+
+        if has_seconds:
+            fields.append(date_string[17:19])
+
+        is_layout_valid = (
+            date_string[4] == '/' and
+            date_string[7] == '/' and
+            date_string[10] == ' ' and
+            date_string[13] == ':' and
+            (not has_seconds or date_string[16] == ':') and
+            all(field.isdigit() for field in fields)
+        )
+
+        if is_layout_valid:
+            return datetime(*[int(field) for field in fields])
+
+    return datetime.strptime(date_string, date_format)
+
+def get_active_project_name(line):
+    """
+    Return the project of a start entry not yet committed
+    (i <date> <time> ###<project>###), None for any other line
+    """
+    if not line.startswith('i '):
+        return None
+
+    name_start = line.find('###') + 3
+
+    if name_start == 2:
+        return None
+
+    name_end = line.find('###', name_start)
+
+    if name_end <= name_start:
+        return None
+
+    return line[name_start:name_end]
+
+def parse_entry_date(line, line_number):
+    """
+    Return the date of an i/o ledger line, exit on a malformed one
+    """
+    try:
+        return parse_date(line[2:21], LEDGER_DATE_FORMAT)
+    except ValueError:
+        print("ERROR: Malformed time entry at line {} of the ledger: {}".format(line_number, line))
+        exit(1)
+
+def get_time_entries(ledger_content: bytes, project_name: str, now: datetime):
+    """
+    Return (date, account, payee, seconds) of each time entry of the ledger content
+    whose account matches the project_name regex (case insensitive, as
+    ledger does), closed entries first and entries still open (running
+    until now) last
+    """
+    import re
+
+    try:
+        project_re = re.compile(project_name, re.IGNORECASE)
+    except re.error as e:
+        print("ERROR: Invalid project pattern {}: {}".format(project_name, e))
+        exit(1)
+
+    closed_entries = []
+    open_entries = []
+
+    for line_number, line in enumerate(ledger_content.decode('utf-8').split("\n"), 1):
+        if line.startswith("i "):
+            account, _, payee = line[22:].partition("  ")
+            open_entries.append((
+                parse_entry_date(line, line_number),
+                account,
+                payee.strip()
+            ))
+        elif line.startswith("o "):
+            if not open_entries:
+                print("ERROR: Time entry end without a start at line {} of the ledger: {}".format(line_number, line))
+                exit(1)
+
+            closed_entries.append((
+                open_entries.pop(),
+                parse_entry_date(line, line_number)
+            ))
+
+    # Open entries starting in the future (e.g. the one commit opens
+    # a few seconds ahead) have not started yet
+    closed_entries += [(entry, now) for entry in open_entries if entry[0] <= now]
+
+    return [
+        (start, account, payee, max((end - start).total_seconds(), 0))
+        for (start, account, payee), end in closed_entries
+        if project_re.search(account)
+    ]
+
+def format_duration(seconds):
+    """
+    Render a duration in seconds, minutes or hours
+    """
+    if seconds < 60:
+        return "{:.0f}s".format(seconds)
+
+    if seconds < 3600:
+        return "{:.1f}m".format(seconds / 60)
+
+    return "{:.2f}h".format(seconds / 3600)
 
 class ActiveProject(object):
     def __init__(self, name, start_string = "", end_string=""):
         self.name = name
-        self.start = self.parse_date_or_none(start_string)
-        self.end = self.parse_date_or_none(end_string)
-        self.isPaused = self.end != None
+        # Entry dates are only parsed when they are first accessed
+        self._start_raw = start_string
+        self._end_raw = end_string
+        self.isPaused = end_string != ""
 
     def __str__(self):
         return "{}: [{}, {}] P: {}".format(
@@ -70,78 +426,211 @@ class ActiveProject(object):
             self.isPaused
         )
 
+    @property
+    def start(self):
+        if not hasattr(self, "_start"):
+            self._start = self.parse_date_or_none(self._start_raw)
+
+        return self._start
+
+    @property
+    def end(self):
+        if not hasattr(self, "_end"):
+            self._end = self.parse_date_or_none(self._end_raw)
+
+        return self._end
+
     def parse_date_or_none(self, date_string):
         if date_string == "":
             return None
 
-        date_string = date_string.split("###")[0].strip()
+        # Start entries end with the ###<project>### placeholder
+        date_string = date_string.partition("###")[0].strip()
+
+        return parse_date(date_string[2:], LEDGER_DATE_FORMAT)
+
+def find_active_project_entry(ledger):
+    """
+    Return the last start entry not yet committed of the ledger
+    content (bytes or mmap) as an ActiveProject, None if there is none
+    """
+    search_end = len(ledger)
+
+    # Jump straight from one start entry to the previous one
+    while search_end > 0:
+        line_start = ledger.rfind(b"\ni ", 0, search_end) + 1
+
+        if line_start == 0 and ledger[:2] != b"i ":
+            return None
+
+        line_end = ledger.find(b"\n", line_start)
+
+        if line_end == -1:
+            line_end = len(ledger)
+
+        line = ledger[line_start:line_end].decode('utf-8')
+        project_name = get_active_project_name(line)
+
+        if project_name:
+            # if line is the last line,
+            # it means that this project has not been
+            # paused
+            next_line_start = line_end + 1
+            next_line_end = ledger.find(b"\n", next_line_start)
+
+            if next_line_end == -1:
+                next_line_end = len(ledger)
+
+            next_line = ledger[next_line_start:next_line_end].decode('utf-8')
+
+            return ActiveProject(project_name, line, next_line)
+
+        search_end = line_start
+
+    return None
+
+def get_display_width(text):
+    """
+    Number of terminal columns taken by text, wide characters take two
+    """
+    if text.isascii():
+        return len(text)
+
+    return sum(
+        2 if unicodedata.east_asian_width(char) in ('F', 'W') else 1
+        for char in text
+    )
+
+def split_key_presses(data: bytes) -> List[bytes]:
+    """
+    Split bytes read from the terminal into single key presses: escape
+    sequences (CSI "ESC [ ... <final>", SS3 "ESC O <char>") are kept whole,
+    any other byte is a key on its own
+    """
+    keys = []
+    index = 0
+
+    while index < len(data):
+        key_end = index + 1
+
+        if data[index:index + 1] == b'\x1b' and data[index + 1:index + 2] == b'O':
+            key_end = index + 3
+        elif data[index:index + 1] == b'\x1b' and data[index + 1:index + 2] == b'[':
+            key_end = index + 2
+
+            # Parameter and intermediate bytes, up to the final byte
+            while key_end < len(data) and 0x20 <= data[key_end] <= 0x3f:
+                key_end += 1
+
+            key_end += 1
+
+        keys.append(data[index:key_end])
+        index = key_end
+
+    return keys
+
+class TaskTable(object):
+    """
+    Table of the tasks list, laid out as terminaltables' SingleTable
+    (or AsciiTable when only_ascii is set) does for single line cells
+    """
+    # Left, junction, right and fill characters of each horizontal border,
+    # the vertical border is the left character of the row border
+    LINE_DRAWING_BORDERS = {
+        "top": ("l", "w", "k", "q"),
+        "heading": ("t", "n", "u", "q"),
+        "bottom": ("m", "v", "j", "q"),
+        "row": ("x", "x", "x", " "),
+    }
+    ASCII_BORDERS = {
+        "top": ("+", "+", "+", "-"),
+        "heading": ("+", "+", "+", "-"),
+        "bottom": ("+", "+", "+", "-"),
+        "row": ("|", "|", "|", " "),
+    }
+
+    # Switch to and from the DEC line drawing character set
+    LINE_DRAWING_ON = "\x1b(0"
+    LINE_DRAWING_OFF = "\x1b(B"
 
-        date_format = "{} %Y/%m/%d %H:%M:%S".format(date_string[0])
+    def __init__(self, table_data: List[List], only_ascii: bool = False):
+        self.table_data = table_data
+        self.only_ascii = only_ascii
 
-        return datetime.strptime(date_string, date_format)
+    @property
+    def table(self):
+        cells = [[str(cell) for cell in row] for row in self.table_data]
+        widths = [
+            max(get_display_width(row[column]) for row in cells)
+            for column in range(len(cells[0]))
+        ]
+
+        # The row layout only depends on the column widths, build it once
+        if self.only_ascii:
+            borders = self.ASCII_BORDERS
+            vertical = borders["row"][0]
+        else:
+            borders = self.LINE_DRAWING_BORDERS
+            vertical = self.LINE_DRAWING_ON + borders["row"][0] + self.LINE_DRAWING_OFF
+
+        row_template = vertical + vertical.join([" {} "] * len(widths)) + vertical
+
+        lines = [self.render_border(borders["top"], widths)]
+
+        for index, row in enumerate(cells):
+            lines.append(self.render_row(row_template, row, widths))
+
+            if index == 0 and len(cells) > 1:
+                lines.append(self.render_border(borders["heading"], widths))
+
+        lines.append(self.render_border(borders["bottom"], widths))
+
+        return "\n".join(lines)
+
+    def render_border(self, border, widths: List[int]):
+        left, junction, right, fill = border
+
+        line = left + junction.join(fill * (width + 2) for width in widths) + right
+
+        if self.only_ascii:
+            return line
+
+        return self.LINE_DRAWING_ON + line + self.LINE_DRAWING_OFF
+
+    def render_row(self, row_template: str, row: List[str], widths: List[int]):
+        return row_template.format(*[
+            cell + " " * (width - get_display_width(cell))
+            for cell, width in zip(row, widths)
+        ])
 
 class TaskManager(object):
     def __init__(self):
         pass
 
     def parse_args(self, active_project: ActiveProject, cli_args: List[str]):
-        parser = argparse.ArgumentParser(
-            description="Manage task related activities",
-            usage=tasks_usage_string
-        )
+        action = parse_action(cli_args, tasks_usage_string)
 
-        parser.add_argument(
-            "action",
-            help="Action to take"
-        )
-
-        args, _ = parser.parse_known_args(cli_args[0:1])
+        # Action lookup inside the dispatch table
+        action_function = self.actions.get(action)
 
-        # Action lookup inside class methods
-        if not hasattr(self, args.action):
-            print('ERROR: Action not recognized: {}'.format(args.action))
-            print('')
-            parser.print_help()
+        if action_function == None:
+            print('ERROR: Action not recognized: {}'.format(action))
+            print(tasks_usage_string)
             exit(1)
 
         self.cli_args = cli_args[1:]
         self.active_project = active_project
 
         # Invoke action's relative function
-        getattr(self, args.action)()
+        action_function(self)
 
         pass
 
     def add(self):
-        parser = argparse.ArgumentParser(
-            description="Add different tasks to a project (default to active_project)",
-            usage="dm tasks add [-h] [-p <project_name>] [-c <context>] [-r <priority>] [<task>]"
-        )
-
-        parser.add_argument(
-            "-p",
-            "--project",
-            help="Project to add tasks to"
-        )
+        import uuid
+        from todotxt import TodoEntry
 
-        parser.add_argument(
-            "-c",
-            "--context",
-            help="Context to add to the task (as defined in the project file configuration)"
-        )
-
-        parser.add_argument(
-            "-r",
-            "--priority",
-            choices=["A", "B", "C", "D", "E", "F", "G"],
-            help="Priority of the task to create"
-        )
-
-        parser.add_argument(
-            'task',
-            nargs='?',
-            default=None
-        )
+        parser = get_tasks_add_parser()
 
         args = parser.parse_args(self.cli_args)
 
@@ -219,30 +708,7 @@ class TaskManager(object):
         print("No tasks added")
 
     def list(self):
-        parser = argparse.ArgumentParser(
-            description="Get all task for a given project (defaults to active project)",
-            usage="dm tasks list [-h] [-p <project_name>] [-n <number>]"
-        )
-
-        parser.add_argument(
-            "-p",
-            "--project",
-            help="Project to show all tasks of"
-        )
-
-        parser.add_argument(
-            "-a",
-            "--all",
-            action="store_true",
-            help="Show all tasks (completed and to be done)"
-        )
-
-        parser.add_argument(
-            "-n",
-            "--number",
-            type=int,
-            help="Number of tasks to print to output"
-        )
+        parser = get_tasks_list_parser()
 
         args, _ = parser.parse_known_args(self.cli_args)
 
@@ -264,16 +730,7 @@ class TaskManager(object):
         print(tasks.table)
 
     def delete(self):
-        parser = argparse.ArgumentParser(
-            description="Delete a task from a project (defaults to active project)",
-            usage="dm tasks delete [-h] [-p <project_name>]"
-        )
-
-        parser.add_argument(
-            "-p",
-            "--project",
-            help="Project to show all tasks of"
-        )
+        parser = get_tasks_delete_parser()
 
         args, _ = parser.parse_known_args(self.cli_args)
 
@@ -282,23 +739,25 @@ class TaskManager(object):
         if args.project:
             project = ActiveProject(args.project)
 
-        choosen_task = self.choose_active_task(project)
+        todo_file = self.load_todo_file(project)
+
+        choosen_task = self.choose_active_task(project, todo_file)
 
         if not choosen_task:
             print("Cancel action")
             exit(1)
 
-        todo_file = self.load_todo_file(project)
         todo_file.remove_entry(choosen_task)
         todo_file.save()
 
         print("Task deleted")
 
-    def get_tasks_list(self, project: ActiveProject, limit: int, all_tasks: bool = False, only_ascii: bool = False):
+    def get_tasks_list(self, project: ActiveProject, limit: int, all_tasks: bool = False, only_ascii: bool = False, todo_file: TodoFile = None):
         """
         Return not done tasks by default, all only if asked
         """
-        todo_file = self.load_todo_file(project)
+        if todo_file == None:
+            todo_file = self.load_todo_file(project)
 
         if len(todo_file.todo_entries) == 0:
             print("No entries")
@@ -308,35 +767,26 @@ class TaskManager(object):
             ["X", "ID", "P", "Date", "CTX", "Task"],
         ]
 
-        entry: TodoEntry
-        for index, entry  in enumerate(todo_file.todo_entries):
-            if limit > -1 and index == limit:
-                break
-
-            if not all_tasks and entry.completed:
-                continue
-
-            formatted_date = datetime.strptime(entry.created_date, "%Y-%m-%d")
-            formatted_date = datetime.strftime(formatted_date, "%d/%m/%y")
+        entries: List[TodoEntry] = [
+            entry for entry in todo_file.todo_entries[:limit if limit > -1 else None]
+            if all_tasks or not entry.completed
+        ]
 
-            table_data.append([
-                "x" if entry.completed else "",
-                entry.tags.get('id', ''),
-                entry.priority,
-                formatted_date,
-                next(iter(entry.contexts))[:3].upper(),
-                entry.tags['task'].replace("_", " ")
-            ])
+        # Build each column in a single pass over the entries
+        done_marks = ["x" if entry.completed else "" for entry in entries]
+        ids = [entry.tags.get('id', '') for entry in entries]
+        priorities = [entry.priority for entry in entries]
+        dates = [format_created_date(entry.created_date) for entry in entries]
+        contexts = [next(iter(entry.contexts), "")[:3].upper() for entry in entries]
+        descriptions = [entry.tags['task'].replace("_", " ") for entry in entries]
 
-        if only_ascii:
-            table = AsciiTable(table_data)
-        else:
-            table = SingleTable(table_data)
+        table_data += map(list, zip(done_marks, ids, priorities, dates, contexts, descriptions))
 
-        return table
+        return TaskTable(table_data, only_ascii)
 
-    def get_task(self, project: ActiveProject, task_id: str) -> TodoEntry:
-        todo_file = self.load_todo_file(project)
+    def get_task(self, project: ActiveProject, task_id: str, todo_file: TodoFile = None) -> TodoEntry:
+        if todo_file == None:
+            todo_file = self.load_todo_file(project)
 
         if len(todo_file.todo_entries) == 0:
             return None
@@ -352,12 +802,13 @@ class TaskManager(object):
             return None
 
     def load_todo_file(self, project: ActiveProject):
+        from todotxt import TodoFile
+
         if project == None:
             print("ERROR: No active project & no project set. Use -p to select a project")
             exit(1)
 
-        todo_file_path = "{}/{}_TODO.txt".format(CONFIG_FOLDER, project.name)
-        todo_file_path = os.path.expanduser(todo_file_path)
+        todo_file_path = get_todo_file_path(project.name)
 
         try:
             todo_file: TodoFile = TodoFile(todo_file_path)
@@ -383,72 +834,119 @@ class TaskManager(object):
         print("{} tasks saved in project {}".format(len(tasks), project.name))
         exit(0)
 
-    def choose_active_task(self, project: ActiveProject):
-        tasks = self.get_tasks_list(project, -1)
+    def choose_active_task(self, project: ActiveProject, todo_file: TodoFile = None):
+        import termios
+        import tty
+        from blessed import Terminal
+
+        # The same todo file is used to list and to look up the tasks
+        if todo_file == None:
+            todo_file = self.load_todo_file(project)
+
+        tasks = self.get_tasks_list(project, -1, todo_file=todo_file)
 
         t = Terminal()
 
         selected_task_index = -1
         save_choice = False
         is_tasks_loop = True
-        char = 0
-
-        while is_tasks_loop:
-            print("")
-            print("Select a task to commit using arrows")
-            print("{}Press Enter to save{}".format(t.green, t.normal))
-            print("{}Q or X to discard{}".format(t.red, t.normal))
-            print(tasks.table)
-
-            if selected_task_index != -1:
-                selected_task_description = tasks.table_data[selected_task_index+1][5]
-            else:
-                selected_task_description = "No task selected"
-
-            print("")
-            print(" " * t.width, end="\r")
-            print("{}Choosen task:{} {}".format(t.bold, t.normal, selected_task_description))
+        # Static part of the frame
+        header = "\n".join([
+            "",
+            "Select a task to commit using arrows",
+            "{}Press Enter to save{}".format(t.green, t.normal),
+            "{}Q or X to discard{}".format(t.red, t.normal),
+            ""
+        ])
+        # Render the table once, selection changes only patch the
+        # marker cell of the affected rows
+        table_lines = tasks.table.split("\n")
+        marker_offset = table_lines[1].index("X")
+
+        # Header, task list and selected task reminder lines
+        frame_height = 4 + len(table_lines) + 2
+        changed_rows = None
+
+        # Keep the terminal in cbreak mode for the whole selection
+        stdin_fd = sys.stdin.fileno()
+        terminal_settings = termios.tcgetattr(stdin_fd)
 
-            char = getch.getch()
-
-            # Up arrow
-            if ord(char) == 65:
-                if selected_task_index != -1:
-                    # Unselect previousely selected index
-                    tasks.table_data[selected_task_index + 1][0] = ""
-
-                selected_task_index -= 1
-                selected_task_index = max(selected_task_index, 0)
-
-                tasks.table_data[selected_task_index + 1][0] = "*"
+        try:
+            tty.setcbreak(stdin_fd)
 
-            # Down arrow
-            elif ord(char) == 66:
+            while is_tasks_loop:
                 if selected_task_index != -1:
-                    # Unselect previousely selected index
-                    tasks.table_data[selected_task_index + 1][0] = ""
-
-                selected_task_index += 1
-                selected_task_index = min(selected_task_index, len(tasks.table_data) - 1 - 1)
-
-                tasks.table_data[selected_task_index + 1][0] = "*"
-
-            elif ord(char) == 10:
-                # Enter
-                save_choice = True
-                is_tasks_loop = False
-            elif ord(char) == 113:
-                # q
-                save_choice == False
-                is_tasks_loop = False
-
-            if is_tasks_loop:
-                # Account for selected task reminder
-                print(t.move_up * 2, end='\r')
-                # Account for task list
-                print(t.move_up * len(tasks.table.split("\n")), end="\r")
-                # Account for header
-                print(t.move_up * 4, end='\r')
+                    selected_task_description = tasks.table_data[selected_task_index+1][5]
+                else:
+                    selected_task_description = "No task selected"
+
+                if changed_rows == None:
+                    # First draw, emit the whole frame
+                    frame = [header, "\n".join(table_lines), "\n\n"]
+                else:
+                    # Redraw only the changed table lines, moving up from
+                    # the bottom of the frame and back down afterwards
+                    frame = []
+
+                    for row in changed_rows:
+                        line_index = row + 3
+                        line = table_lines[line_index]
+                        table_lines[line_index] = "".join([
+                            line[:marker_offset],
+                            "*" if row == selected_task_index else " ",
+                            line[marker_offset + 1:]
+                        ])
+
+                        distance = frame_height - 4 - line_index
+                        frame += [
+                            t.move_up * distance,
+                            "\r",
+                            table_lines[line_index],
+                            "\n" * distance
+                        ]
+
+                    frame += [t.move_up, "\r"]
+
+                # Emit the update with a single write
+                sys.stdout.write("".join(frame + [
+                    " " * t.width,
+                    "\r",
+                    "{}Choosen task:{} {}\n".format(t.bold, t.normal, selected_task_description)
+                ]))
+                sys.stdout.flush()
+
+                previous_task_index = selected_task_index
+
+                # Everything typed since the last redraw, possibly more than one key
+                for key in split_key_presses(os.read(stdin_fd, 64)):
+                    if key in ARROW_UP_KEYS:
+                        selected_task_index -= 1
+                        selected_task_index = max(selected_task_index, 0)
+
+                    elif key in ARROW_DOWN_KEYS:
+                        selected_task_index += 1
+                        selected_task_index = min(selected_task_index, len(tasks.table_data) - 1 - 1)
+
+                    elif key in (b'\n', b'\r'):
+                        # Enter
+                        save_choice = True
+                        is_tasks_loop = False
+                        break
+                    elif key in (b'q', b'x'):
+                        # q or x
+                        save_choice == False
+                        is_tasks_loop = False
+                        break
+
+                if previous_task_index == selected_task_index:
+                    changed_rows = []
+                else:
+                    changed_rows = [
+                        row for row in (previous_task_index, selected_task_index)
+                        if row != -1
+                    ]
+        finally:
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, terminal_settings)
 
         choosen_task = None
 
@@ -456,10 +954,17 @@ class TaskManager(object):
             choosed_task_id = tasks.table_data[selected_task_index+1][1]
 
             # Task look up
-            choosen_task = self.get_task(project, choosed_task_id)
+            choosen_task = self.get_task(project, choosed_task_id, todo_file)
 
         return choosen_task
 
+    # Actions that can be invoked from the CLI
+    actions = {
+        "add": add,
+        "list": list,
+        "delete": delete,
+    }
+
 class DreamMate(object):
     """
     Lookup table with the value of dry_run
@@ -467,6 +972,8 @@ class DreamMate(object):
     for each action
     """
     active_project = None
+    time_journal_fd = None
+    ledger_bootstrapped = False
     actions_active_project_dry_run = {
         "start": True,
         "commit": False,
@@ -480,55 +987,49 @@ class DreamMate(object):
     def __init__(self):
         self.task_manager = TaskManager()
 
-        parser = argparse.ArgumentParser(
-            description="Your best Task Manager tool",
-            usage=usage_string
-        )
+        action = parse_action(sys.argv[1:], usage_string)
 
-        parser.add_argument('action', help='Action to take')
-        # Exclude args other than the first [1:2]
-        args = parser.parse_args(sys.argv[1:2])
+        # Action lookup inside the dispatch table
+        action_function = self.actions.get(action)
 
-        # Action lookup inside class methods
-        if not hasattr(self, args.action):
-            print('ERROR: Action not recognized: {}'.format(args.action))
-            print('')
-            parser.print_help()
+        if action_function == None:
+            print('ERROR: Action not recognized: {}'.format(action))
+            print(usage_string)
             exit(1)
 
-        self.store_active_project_or_exit(args.action)
+        atexit.register(self.close_time_journal)
+
+        self.store_active_project_or_exit(action)
 
         # Invoke action's relative function
-        getattr(self, args.action)()
+        action_function(self)
 
     # ACTIONS
     def start(self):
-        parser = argparse.ArgumentParser(
-            description="Start tracking time for a given project",
-            usage="dm start <project> [<args>]"
-        )
-
-        parser.add_argument('project', help="Project to start tracking time for")
+        project_name = parse_positional_args("start", sys.argv[2:])[0]
 
-        args = parser.parse_args(sys.argv[2:])
-
-        if self.active_project != None and self.active_project.name == args.project:
+        if self.active_project != None and self.active_project.name == project_name:
             print("ERROR: Cannot start a project with the same name of the currently active project")
             print("Current project: {}\nProject to be started: {}".format(
                 self.active_project.name,
-                args.project
+                project_name
             ))
             exit(1)
 
 
-        if self.active_project != None and not self.active_project.isPaused:
-            self.pause()
+        start_time = datetime.now()
 
         new_project = ActiveProject(
-            args.project,
+            project_name,
         )
 
-        self.doStart(new_project, datetime.now())
+        # The active project is already known: close its time entry
+        # directly, with the same timestamp used for the new one
+        if self.active_project != None and not self.active_project.isPaused:
+            print("Pausing project: {}".format(self.active_project))
+            self.doEndStart(self.active_project, start_time, new_project, start_time)
+        else:
+            self.doStart(new_project, start_time)
 
         print("Started project: {}".format(new_project.name))
 
@@ -541,12 +1042,7 @@ class DreamMate(object):
         self.doEnd(self.active_project, datetime.now())
 
     def commit(self):
-        parser = argparse.ArgumentParser(
-            description="Ends current activity on current project by choosing a task to set done",
-            usage="dm commit [<args>]"
-        )
-
-        args = parser.parse_args(sys.argv[2:])
+        parse_positional_args("commit", sys.argv[2:])
 
         if self.active_project.isPaused:
             print("ERROR: Cannot commit a paused active project, restart it beforehand")
@@ -559,7 +1055,7 @@ class DreamMate(object):
             print("Cancel action")
             exit(1)
 
-        context = list(choosen_task.contexts)[0]
+        context = next(iter(choosen_task.contexts))
         payload = choosen_task.tags['task'].replace("_", " ")
 
         commit_msg = "{} | {}".format(context, payload)
@@ -576,105 +1072,130 @@ class DreamMate(object):
             exit(1)
 
         if task_context['isGit']:
-            commit_commands = get_scm_commit_commands(
+            import subprocess
+
+            commit_command = get_scm_commit_command(
                 "git",
                 commit_msg
             )
 
-            for command in commit_commands:
-                try:
-                    subprocess.check_output(
-                        command,
-                        stderr=subprocess.STDOUT,
-                        cwd=os.path.expanduser(active_project_conf['root'])
-                    )
+            try:
+                subprocess.run(
+                    commit_command,
+                    check=True,
+                    capture_output=True,
+                    cwd=os.path.expanduser(active_project_conf['root'])
+                )
 
-                except subprocess.CalledProcessError as e:
-                    print(e.output)
-                    exit(1)
+            except subprocess.CalledProcessError as e:
+                print(e.stdout + e.stderr)
+                exit(1)
 
         end_time = datetime.now()
 
-        self.doEnd(self.active_project, end_time)
-
         # Substitude each occurrence of ###<current_project>### with
         # <current_project>  <message>
         project_placeholder = "###{}###".format(self.active_project.name)
         project_account_payload = "{}:{}  {}".format(self.active_project.name, context, payload)
 
-        ledger_file_path = self.load_time_journal(mode='r', only_path = True)
+        ledger_file_path = self.get_ledger_path()
 
-        with fileinput.FileInput(ledger_file_path, inplace=True, backup='.bak') as file:
-            for line in file:
-                print(line.replace(
-                    project_placeholder,
-                    project_account_payload
-                ), end='')
+        ledger_tmp_file_path = "{}.tmp".format(ledger_file_path)
 
-        self.doStart(self.active_project, end_time + timedelta(seconds=10))
+        with open(ledger_file_path, 'rb') as ledger_file:
+            ledger_content = ledger_file.read()
 
-        print("Task committed successfully")
+        # Entries before the first placeholder are already committed,
+        # nothing is rewritten when there is no placeholder at all
+        placeholder_index = ledger_content.find(project_placeholder.encode('utf-8'))
 
-    def current(self):
-        print("Current project: {}".format(self.active_project))
+        if placeholder_index != -1:
+            ledger_tail = ledger_content[placeholder_index:].replace(
+                project_placeholder.encode('utf-8'),
+                project_account_payload.encode('utf-8')
+            )
 
-    def log(self):
-        parser = argparse.ArgumentParser(
-            description="Get every time entry for a given project",
-            usage="dm log <project> [<args>]"
+            # Write the whole ledger at once and make sure it reached the disk
+            # before atomically swapping it in, so no backup copy is needed
+            with open(ledger_tmp_file_path, 'wb') as ledger_tmp_file:
+                ledger_tmp_file.write(ledger_content[:placeholder_index])
+                ledger_tmp_file.write(ledger_tail)
+                ledger_tmp_file.flush()
+                os.fsync(ledger_tmp_file.fileno())
+
+            os.replace(ledger_tmp_file_path, ledger_file_path)
+
+            # The open journal still points to the replaced file,
+            # the next append opens the new one
+            self.close_time_journal()
+
+        # Close the committed entry and open the next one
+        self.doEndStart(
+            self.active_project,
+            end_time,
+            self.active_project,
+            end_time + timedelta(seconds=10)
         )
 
-        parser.add_argument(
-            'project',
-            help="Project to check time entries of"
-        )
+        print("Task committed successfully")
 
-        args = parser.parse_args(sys.argv[2:])
+    def current(self):
+        print("Current project: {}".format(self.active_project))
 
-        ledger_file_path = os.path.expanduser("{}/{}".format(CONFIG_FOLDER, "time.ledger"))
+    def log(self):
+        cli_args = sys.argv[2:]
+        use_ledger = "--legacy" in cli_args
+
+        project_name = parse_positional_args(
+            "log",
+            [arg for arg in cli_args if arg != "--legacy"]
+        )[0]
+
+        ledger_file_path = self.get_ledger_path()
+
+        if use_ledger:
+            import subprocess
+
+            # ledger writes its report straight to the inherited stdout
+            subprocess.run([
+                'ledger',
+                'reg',
+                '-f',
+                ledger_file_path,
+                '--format',
+                '%d|%15a|%-40P|%8t|\n',
+                '--date-format',
+                '%d/%m/%Y',
+                project_name
+            ])
+            return
 
-        p = subprocess.Popen([
-            'ledger',
-            'reg',
-            '-f',
-            ledger_file_path,
-            '--format',
-            '%d|%15a|%-40P|%8t|\n',
-            '--date-format',
-            '%d/%m/%Y',
-            args.project
-        ], stdout=subprocess.PIPE)
+        with open(ledger_file_path, 'rb') as ledger_file:
+            time_entries = get_time_entries(ledger_file.read(), project_name, datetime.now())
 
-        std_out, _ = p.communicate()
+        # Columns of the --format used for the ledger register report:
+        # date, account, payee and amount of each entry
+        report = []
 
-        lines = std_out.decode('utf-8').split("\n")[:-1]
+        for start, account, payee, seconds in time_entries:
+            report.append("{:%d/%m/%Y}|{:>15}|{:<40}|{:>8}|\n".format(
+                start,
+                account,
+                payee,
+                format_duration(seconds)
+            ))
 
-        for line in lines:
-            print(line)
+        sys.stdout.write("".join(report))
 
     def restart(self):
-        parser = argparse.ArgumentParser(
-            description="Restart the current project so that changes can be committed. A custom datetime can be set as restart time",
-            usage="dm restart -d <datetime> -p <project>"
-        )
-
-        parser.add_argument(
-            '-d',
-            '--datetime',
-            help="Datetime in Y/m/d H:M to use as a restart date"
-        )
-        parser.add_argument(
-            '-p',
-            '--project',
-            help="Project to restart if current project is not paused but already committed"
-        )
+        parser = get_restart_parser()
 
         args = parser.parse_args(sys.argv[2:])
 
         restart_datetime = datetime.now()
 
         if (args.datetime != None):
-            restart_datetime = datetime.strptime(args.datetime, "%Y/%m/%d %H:%M")
+            restart_datetime = parse_date(args.datetime, RESTART_DATE_FORMAT)
 
         if self.active_project == None or not self.active_project.isPaused:
             # Start a new task with current date set
@@ -702,6 +1223,8 @@ class DreamMate(object):
         self.task_manager.parse_args(self.active_project, sys.argv[2:])
 
     def create(self):
+        import yaml
+
         print("Creating project configuration")
 
         name: str = ""
@@ -737,7 +1260,7 @@ class DreamMate(object):
             "contexts": contexts
         }
 
-        config_file_path = os.path.expanduser("{}/{}.yaml".format(CONFIG_FOLDER, project['name']))
+        config_file_path = "{}/{}.yaml".format(CONFIG_FOLDER_PATH, project['name'])
         config_file_handle = open(config_file_path, "w+")
 
         yaml.dump(project, config_file_handle, default_flow_style=False)
@@ -758,69 +1281,105 @@ class DreamMate(object):
             dry_run=self.actions_active_project_dry_run[action]
         )
 
-    def load_time_journal(self, mode = 'r', only_path=False):
-        fileHandle = None
-        config_folder_path = os.path.expanduser("{}".format(CONFIG_FOLDER))
-        ledger_file_path = "{}/time.ledger".format(config_folder_path)
+    def get_ledger_path(self):
+        """
+        Return the time journal path, creating the config folder
+        and an empty journal the first time if they are missing
+        """
+        # Existence checks are only needed once per run
+        if not DreamMate.ledger_bootstrapped:
+            if not os.path.exists(LEDGER_FILE_PATH):
+                if not os.path.exists(CONFIG_FOLDER_PATH):
+                    os.mkdir(CONFIG_FOLDER_PATH)
+
+                with open(LEDGER_FILE_PATH, "w"):
+                    pass
+
+            DreamMate.ledger_bootstrapped = True
+
+        return LEDGER_FILE_PATH
+
+    def open_time_journal(self):
+        """
+        Keep a low level append only descriptor on the time journal
+        for the whole run, entries are written with a single os.write.
+        Opened by the first append, read only actions never open it.
+        O_DSYNC makes each write durable as it happens, trading a little
+        latency per append for no separate fsync
+        """
+        ledger_file_path = self.get_ledger_path()
 
-        if not os.path.exists(ledger_file_path):
-            if not os.path.exists(config_folder_path):
-                os.mkdir(config_folder_path)
+        self.time_journal_fd = os.open(
+            ledger_file_path,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC | os.O_DSYNC,
+            0o644
+        )
 
-            fileHandle = open(ledger_file_path, "w")
-            fileHandle.write("")
+    def close_time_journal(self):
+        if self.time_journal_fd != None:
+            os.close(self.time_journal_fd)
+            self.time_journal_fd = None
 
-        if only_path:
-            return ledger_file_path
+    def append_time_entries(self, entries: List[str]):
+        if self.time_journal_fd == None:
+            self.open_time_journal()
 
-        return open(ledger_file_path, mode)
+        os.write(self.time_journal_fd, "".join(entries).encode('utf-8'))
 
     def doStart(self, project, entry_time):
         start_time = self.get_time_string("start", entry_time, project)
 
-        time_journal = self.load_time_journal('a')
-        time_journal.write(start_time)
-        time_journal.close()
+        self.append_time_entries([start_time])
 
     def doEnd(self, project, entry_time):
         end_time = self.get_time_string("end", entry_time, project)
 
-        time_journal = self.load_time_journal('a')
-        time_journal.write(end_time)
-        time_journal.close()
+        self.append_time_entries([end_time])
+
+    def doEndStart(self, end_project, end_time, start_project, start_time):
+        """
+        Close a time entry and open the next one with a single write
+        """
+        self.append_time_entries([
+            self.get_time_string("end", end_time, end_project),
+            self.get_time_string("start", start_time, start_project)
+        ])
 
     def get_time_string(self, side, entry_time: datetime, project: ActiveProject = None):
+        t = entry_time
+        # Same as strftime(LEDGER_DATE_FORMAT), without parsing the format
+        entry_date = f"{t.year:04d}/{t.month:02d}/{t.day:02d} {t.hour:02d}:{t.minute:02d}:{t.second:02d}"
+
         if side == "start":
-            return entry_time.strftime("i %Y/%m/%d %H:%M:%S ###{}###\n".format(project.name))
+            return f"i {entry_date} ###{project.name}###\n"
         elif side == "end":
-            return entry_time.strftime("o %Y/%m/%d %H:%M:%S\n")
+            return f"o {entry_date}\n"
         else:
             print("ERROR: Unexpected side: {}".format(side))
             exit(1)
 
     def find_last_active_project(self, action = "", dry_run = False):
-        active_project_re = re.compile('i.*###(.*)###')
-
-        time_journal = self.load_time_journal('r')
-
-        time_entries = time_journal.readlines()
-        time_entries.reverse()
+        ledger_file_path = self.get_ledger_path()
 
         active_project = None
 
-        for index, line in enumerate(time_entries):
-            project_found = active_project_re.findall(line)
-
-            if (len(project_found)):
-                active_project = ActiveProject(
-                    project_found[0],
-                    line,
-                    # if line is the last line,
-                    # it means that this project has not been
-                    # paused
-                    time_entries[index-1] if index > 0 else ""
-                )
-                break
+        # An empty ledger has no active project (and cannot be mapped),
+        # a stat is enough to tell without opening it
+        if os.path.getsize(ledger_file_path) > 0:
+            with open(ledger_file_path, 'rb') as ledger_file:
+                try:
+                    ledger = mmap.mmap(ledger_file.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    # Not mappable (e.g. special file or filesystem), read it whole
+                    ledger = None
+
+                if ledger != None:
+                    try:
+                        active_project = find_active_project_entry(ledger)
+                    finally:
+                        ledger.close()
+                else:
+                    active_project = find_active_project_entry(ledger_file.read())
 
         if active_project == None and not dry_run:
             print("ERROR: No current project found, nothing to {}!".format(action))
@@ -829,12 +1388,13 @@ class DreamMate(object):
         return active_project
 
     def load_project_configuration(self, project_name):
+        import yaml
+
         try:
-            config_file_path = os.path.expanduser("{}/{}.yaml".format(CONFIG_FOLDER, project_name.name))
-            file_content = open(config_file_path, 'r')
+            config_file_path = "{}/{}.yaml".format(CONFIG_FOLDER_PATH, project_name.name)
 
             try:
-                config = yaml.safe_load(file_content)
+                config = load_yaml_file(config_file_path)
                 return config
 
             except yaml.YAMLError as e:
@@ -845,5 +1405,17 @@ class DreamMate(object):
             print("ERROR: Project configuration not found! Not a known project")
             exit(1)
 
+    # Actions that can be invoked from the CLI
+    actions = {
+        "create": create,
+        "start": start,
+        "pause": pause,
+        "commit": commit,
+        "log": log,
+        "current": current,
+        "restart": restart,
+        "tasks": tasks,
+    }
+
 if __name__ == '__main__':
     DreamMate()